@@ -19,8 +19,10 @@ from .query_compile import (
     EvalAll,
     EvalAny,
     EvalCoalesce,
+    EvalCoalesce2,
     EvalColumn,
     EvalConstant,
+    EvalConstantFunction,
     EvalCreateTable,
     EvalGetItem,
     EvalGetter,
@@ -83,8 +85,11 @@ class Compiler:
                 if len(placeholders) != len(parameters):
                     raise ProgrammingError(
                         f'the query has {len(placeholders)} placeholders but {len(parameters)} parameters were passed')
-                for i, placeholder in enumerate(sorted(placeholders, key=lambda node: node.parseinfo.pos)):
-                    placeholder.name = i
+                # Bind positional parameters to the placeholders in order of
+                # appearance. The AST is not modified, thus it can be compiled
+                # again with different parameters.
+                placeholders.sort(key=lambda node: node.parseinfo.pos)
+                self.parameters = {id(placeholder): value for placeholder, value in zip(placeholders, parameters)}
             else:
                 raise ProgrammingError('positional and named parameters cannot be mixed')
 
@@ -484,11 +489,13 @@ class Compiler:
 
     @_compile.register
     def _or(self, node: ast.Or):
-        return EvalOr([self._compile(arg) for arg in node.args])
+        args = [self._compile(arg) for arg in node.args]
+        return fold_constants(EvalOr(args), args)
 
     @_compile.register
     def _and(self, node: ast.And):
-        return EvalAnd([self._compile(arg) for arg in node.args])
+        args = [self._compile(arg) for arg in node.args]
+        return fold_constants(EvalAnd(args), args)
 
     _OPERATORS = {
         '<': ast.Less,
@@ -516,6 +523,13 @@ class Compiler:
         right_dtype = typing.get_origin(right.dtype) or right.dtype
         if right_dtype not in {list, set}:
             raise CompilationError(f'not a list or set but {right_dtype}', node.right)
+
+        left = self._compile(node.left)
+
+        cls = EvalAll if type(node) is ast.All else EvalAny
+        return self._quantified(cls, node.op, left, right, node)
+
+    def _quantified(self, cls, opname, left, right, node):
         args = typing.get_args(right.dtype)
         if args:
             assert len(args) == 1
@@ -523,10 +537,8 @@ class Compiler:
         else:
             right_element_dtype = object
 
-        left = self._compile(node.left)
-
         # lookup operator implementaton and check typing
-        op = self._OPERATORS[node.op]
+        op = self._OPERATORS[opname]
         for func in OPERATORS[op]:
             if func.__intypes__ == [right_element_dtype, left.dtype]:
                 break
@@ -538,60 +550,67 @@ class Compiler:
         # need to instantiate the operaotr implementation to get to the underlying function
         operator = func(None, None).operator
 
-        cls = EvalAll if type(node) is ast.All else EvalAny
-        return cls(operator, left, right)
+        return fold_constants(cls(operator, left, right), [left, right])
 
     @_compile.register
     def _function(self, node: ast.Function):
         operands = [self._compile(operand) for operand in node.operands]
+        return self._call(node.fname, operands, node)
 
+    def _call(self, fname, operands, node):
         # ``row(*)`` is parsed like a function call but does something special
-        if node.fname == 'row' and len(operands) == 1 and operands[0].dtype == types.Asterisk:
+        if fname == 'row' and len(operands) == 1 and operands[0].dtype == types.Asterisk:
             return EvalRow()
 
         # ``coalesce()`` is parsed like a function call but it does
         # not really fit our model for function evaluation, therefore
         # it gets special threatment here.
-        if node.fname == 'coalesce':
+        if fname == 'coalesce':
             for operand in operands:
                 if operand.dtype != operands[0].dtype:
                     dtypes = ', '.join(operand.dtype.__name__ for operand in operands)
                     raise CompilationError(f'coalesce() function arguments must have uniform type, found: {dtypes}', node)
-            return EvalCoalesce(operands)
+            cls = EvalCoalesce2 if len(operands) == 2 else EvalCoalesce
+            return fold_constants(cls(operands), operands)
 
-        function = types.function_lookup(FUNCTIONS, node.fname, operands)
+        function = types.function_lookup(FUNCTIONS, fname, operands)
         if function is None:
-            sig = '{}({})'.format(node.fname, ', '.join(f'{operand.dtype.__name__.lower()}' for operand in operands))
+            sig = '{}({})'.format(fname, ', '.join(f'{operand.dtype.__name__.lower()}' for operand in operands))
             raise CompilationError(f'no function matches "{sig}" name and argument types', node)
 
+        # The following rewrites reuse the already compiled operands.
+
         # Replace ``meta(key)`` with ``meta[key]``.
-        if node.fname == 'meta':
-            key = node.operands[0]
-            node = ast.Function('getitem', [ast.Column('meta', parseinfo=node.parseinfo), key])
-            return self._compile(node)
+        if fname == 'meta':
+            meta = self._column(ast.Column('meta', parseinfo=node.parseinfo))
+            return self._call('getitem', [meta, operands[0]], node)
 
         # Replace ``entry_meta(key)`` with ``entry.meta[key]``.
-        if node.fname == 'entry_meta':
-            key = node.operands[0]
-            node = ast.Function('getitem', [ast.Attribute(ast.Column('entry', parseinfo=node.parseinfo), 'meta'), key])
-            return self._compile(node)
+        if fname == 'entry_meta':
+            meta = self._attribute(ast.Attribute(ast.Column('entry', parseinfo=node.parseinfo), 'meta'))
+            return self._call('getitem', [meta, operands[0]], node)
 
         # Replace ``any_meta(key)`` with ``getitem(meta, key, entry.meta[key])``.
-        if node.fname == 'any_meta':
-            key = node.operands[0]
-            node = ast.Function('getitem', [ast.Column('meta', parseinfo=node.parseinfo), key, ast.Function('getitem', [
-                ast.Attribute(ast.Column('entry', parseinfo=node.parseinfo), 'meta'), key])])
-            return self._compile(node)
+        if fname == 'any_meta':
+            meta = self._column(ast.Column('meta', parseinfo=node.parseinfo))
+            entry_meta = self._attribute(ast.Attribute(ast.Column('entry', parseinfo=node.parseinfo), 'meta'))
+            entry_meta = self._call('getitem', [entry_meta, operands[0]], node)
+            return self._call('getitem', [meta, operands[0], entry_meta], node)
 
         # Replace ``has_account(regexp)`` with ``('(?i)' + regexp) ~? any (accounts)``.
-        if node.fname == 'has_account':
-            node = ast.Any(ast.Add(ast.Constant('(?i)'), node.operands[0]), '?~', ast.Column('accounts'))
-            return self._compile(node)
+        if fname == 'has_account':
+            regexp = self._binop(ast.Add, EvalConstant('(?i)'), operands[0], node)
+            accounts = self._column(ast.Column('accounts'))
+            return self._quantified(EvalAny, '?~', regexp, accounts, node)
 
         function = function(self.context, operands)
-        # Constants folding.
-        if all(isinstance(operand, EvalConstant) for operand in operands) and function.pure:
-            return EvalConstant(function(None), function.dtype)
+        # Functions accessing the context cannot be evaluated at compile time.
+        if function.pure:
+            return fold_constants(function, operands)
+        # But, when their arguments are constant, they need to be evaluated
+        # only once. Aggregates are evaluated over all the rows of a group.
+        if not isinstance(function, EvalAggregator) and all(isinstance(operand, EvalConstant) for operand in operands):
+            return EvalConstantFunction(function)
         return function
 
     @_compile.register
@@ -620,10 +639,7 @@ class Compiler:
             raise CompilationError(
                 f'operator "{type(node).__name__.lower()}({types.name(operand.dtype)})" not supported', node)
         function = function(operand)
-        # Constants folding.
-        if isinstance(operand, EvalConstant):
-            return EvalConstant(function(None), function.dtype)
-        return function
+        return fold_constants(function, [operand])
 
     @_compile.register
     def _between(self, node: ast.Between):
@@ -634,7 +650,7 @@ class Compiler:
         for candidate in OPERATORS[type(node)]:
             if candidate.__intypes__ == intypes:
                 func = candidate(operand, lower, upper)
-                return func
+                return fold_constants(func, [operand, lower, upper])
         raise CompilationError(
             f'operator "{types.name(operand.dtype)} BETWEEN {types.name(lower.dtype)} '
             f'AND {types.name(upper.dtype)}" not supported', node)
@@ -651,23 +667,21 @@ class Compiler:
             right = EvalConstantSubquery1D(right)
 
         op = OPERATORS[type(node)][0]
-        return op(left, right)
+        return fold_constants(op(left, right), [left, right])
 
     @_compile.register
     def _binaryop(self, node: ast.BinaryOp):
         left = self._compile(node.left)
         right = self._compile(node.right)
+        return self._binop(type(node), left, right, node)
 
-        candidates = OPERATORS[type(node)]
+    def _binop(self, optype, left, right, node):
+        candidates = OPERATORS[optype]
         while True:
             intypes = [left.dtype, right.dtype]
             for op in candidates:
                 if op.__intypes__ == intypes:
-                    function = op(left, right)
-                    # Constants folding.
-                    if isinstance(left, EvalConstant) and isinstance(right, EvalConstant):
-                        return EvalConstant(function(None), function.dtype)
-                    return function
+                    return fold_constants(op(left, right), [left, right])
 
             # Implement type inference when one of the operands is not strongly typed.
             if left.dtype is object and right.dtype is not object:
@@ -699,7 +713,7 @@ class Compiler:
             break
 
         raise CompilationError(
-            f'operator "{type(node).__name__.lower()}('
+            f'operator "{optype.__name__.lower()}('
             f'{types.name(left.dtype)}, {types.name(right.dtype)})" not supported', node)
 
     @_compile.register
@@ -716,7 +730,7 @@ class Compiler:
 
     @_compile.register
     def _placeholder(self, node: ast.Placeholder):
-        return EvalConstant(self.parameters[node.name])
+        return EvalConstant(self.parameters[node.name or id(node)])
 
     @_compile.register
     def _asterisk(self, node: ast.Asterisk):
@@ -861,7 +875,8 @@ def get_target_name(target):
 def get_columns_and_aggregates(node):
     """Find the columns and aggregate nodes below this tree.
 
-    All nodes under aggregate nodes are ignored.
+    All nodes under aggregate nodes are ignored. Nodes shared between
+    branches of the tree are reported only once.
 
     Args:
       node: An instance of EvalNode.
@@ -872,41 +887,58 @@ def get_columns_and_aggregates(node):
     """
     columns = []
     aggregates = []
-    _get_columns_and_aggregates(node, columns, aggregates)
+    seen = set()
+    # Walk the tree depth first with an explicit stack, visiting the nodes
+    # in the same order as a recursive pre-order traversal.
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        if isinstance(node, EvalAggregator):
+            aggregates.append(node)
+        elif isinstance(node, EvalColumn):
+            columns.append(node)
+        else:
+            children = list(node.childnodes())
+            children.reverse()
+            stack.extend(children)
     return columns, aggregates
 
 
-def _get_columns_and_aggregates(node, columns, aggregates):
-    """Walk down a tree of nodes and fetch the column accessors and aggregates.
-
-    This function ignores all nodes under aggregate nodes.
+def is_aggregate(node):
+    """Return true if the node is an aggregate.
 
     Args:
       node: An instance of EvalNode.
-      columns: An accumulator for columns found so far.
-      aggregate: An accumulator for aggregate notes found so far.
+    Returns:
+      A boolean.
     """
-    if isinstance(node, EvalAggregator):
-        aggregates.append(node)
-    elif isinstance(node, EvalColumn):
-        columns.append(node)
-    else:
-        for child in node.childnodes():
-            _get_columns_and_aggregates(child, columns, aggregates)
+    # Stop at the first aggregate node found.
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, EvalAggregator):
+            return True
+        if not isinstance(node, EvalColumn):
+            stack.extend(node.childnodes())
+    return False
 
 
-def is_aggregate(node):
-    """Return true if the node is an aggregate.
+def fold_constants(node, operands):
+    """Replace an expression with its value if all its operands are constants.
 
     Args:
-      node: An instance of EvalNode.
+      node: An EvalNode instance that does not depend on the evaluation context
+        other than through its operands.
+      operands: The list of the node operands.
     Returns:
-      A boolean.
+      An EvalConstant with the value of the expression, or the node itself.
     """
-    # Note: We could be a tiny bit more efficient here, but it doesn't matter
-    # much. Performance of the query compilation matters very little overall.
-    _, aggregates = get_columns_and_aggregates(node)
-    return bool(aggregates)
+    if all(isinstance(operand, EvalConstant) for operand in operands):
+        return EvalConstant(node(None), node.dtype)
+    return node
 
 
 def compile(context, statement, parameters=None):
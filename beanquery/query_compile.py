@@ -13,6 +13,7 @@ __license__ = "GNU GPLv2"
 import collections
 import dataclasses
 import datetime
+import functools
 import itertools
 import re
 import operator
@@ -197,10 +198,8 @@ def Operator(op, operands):
 
 unaryop(ast.Not, [types.Any], bool, nullsafe=True)(operator.not_)
 
-@unaryop(ast.Neg, [int], int)
-@unaryop(ast.Neg, [Decimal], Decimal)
-def neg_(x):
-    return -x
+unaryop(ast.Neg, [int], int)(operator.neg)
+unaryop(ast.Neg, [Decimal], Decimal)(operator.neg)
 
 
 @unaryop(ast.IsNull, [types.Any], bool, nullsafe=True)
@@ -213,12 +212,38 @@ def not_null(x):
     return x is not None
 
 
-@binaryop(ast.Mul, [Decimal, Decimal], Decimal)
-@binaryop(ast.Mul, [Decimal, int], Decimal)
-@binaryop(ast.Mul, [int, Decimal], Decimal)
-@binaryop(ast.Mul, [int, int], int)
-def mul_(x, y):
-    return x * y
+# Operators implemented directly by the builtin operator functions.
+_arithmetic = [
+    (ast.Mul, operator.mul, [
+        ([Decimal, Decimal], Decimal),
+        ([Decimal, int], Decimal),
+        ([int, Decimal], Decimal),
+        ([int, int], int),
+    ]),
+    (ast.Add, operator.add, [
+        ([Decimal, Decimal], Decimal),
+        ([Decimal, int], Decimal),
+        ([int, Decimal], Decimal),
+        ([int, int], int),
+        ([str, str], str),
+        ([datetime.date, relativedelta], datetime.date),
+        ([relativedelta, datetime.date], datetime.date),
+        ([relativedelta, relativedelta], relativedelta),
+    ]),
+    (ast.Sub, operator.sub, [
+        ([Decimal, Decimal], Decimal),
+        ([Decimal, int], Decimal),
+        ([int, Decimal], Decimal),
+        ([int, int], int),
+        ([datetime.date, relativedelta], datetime.date),
+        ([relativedelta, datetime.date], datetime.date),
+        ([relativedelta, relativedelta], datetime.date),
+    ]),
+]
+
+for node, op, signatures in _arithmetic:
+    for intypes, outtype in signatures:
+        binaryop(node, intypes, outtype)(op)
 
 
 @binaryop(ast.Div, [Decimal, Decimal], Decimal)
@@ -247,29 +272,6 @@ def mod_(x, y):
     return x % y
 
 
-@binaryop(ast.Add, [Decimal, Decimal], Decimal)
-@binaryop(ast.Add, [Decimal, int], Decimal)
-@binaryop(ast.Add, [int, Decimal], Decimal)
-@binaryop(ast.Add, [int, int], int)
-@binaryop(ast.Add, [str, str], str)
-@binaryop(ast.Add, [datetime.date, relativedelta], datetime.date)
-@binaryop(ast.Add, [relativedelta, datetime.date], datetime.date)
-@binaryop(ast.Add, [relativedelta, relativedelta], relativedelta)
-def add_(x, y):
-    return x + y
-
-
-@binaryop(ast.Sub, [Decimal, Decimal], Decimal)
-@binaryop(ast.Sub, [Decimal, int], Decimal)
-@binaryop(ast.Sub, [int, Decimal], Decimal)
-@binaryop(ast.Sub, [int, int], int)
-@binaryop(ast.Sub, [datetime.date, relativedelta], datetime.date)
-@binaryop(ast.Sub, [relativedelta, datetime.date], datetime.date)
-@binaryop(ast.Sub, [relativedelta, relativedelta], datetime.date)
-def sub_(x, y):
-    return x - y
-
-
 @binaryop(ast.Add, [datetime.date, int], datetime.date)
 def add_date_int(x, y):
     return x + datetime.timedelta(days=y)
@@ -290,19 +292,30 @@ def sub_date_date(x, y):
     return (x - y).days
 
 
+@functools.lru_cache(maxsize=256)
+def compile_regexp(pattern, flags=0):
+    """Compile a regular expression, caching the result.
+
+    Regular expression patterns are often constants in queries and
+    are matched against every row. Looking up the compiled pattern here
+    is cheaper than going through the re module cache every time.
+    """
+    return re.compile(pattern, flags)
+
+
 @binaryop(ast.Match, [str, str], bool)
 def match_(x, y):
-    return bool(re.search(y, x, re.IGNORECASE))
+    return compile_regexp(y, re.IGNORECASE).search(x) is not None
 
 
 @binaryop(ast.NotMatch, [str, str], bool)
 def not_match_(x, y):
-    return not bool(re.search(y, x, re.IGNORECASE))
+    return compile_regexp(y, re.IGNORECASE).search(x) is None
 
 
 @binaryop(ast.Matches, [str, str], bool)
 def matches_(x, y):
-    return bool(re.search(x, y))
+    return compile_regexp(x).search(y) is not None
 
 
 @binaryop(ast.In, [types.Any, set], bool)
@@ -405,12 +418,27 @@ class EvalCoalesce(EvalNode):
         return None
 
 
+class EvalCoalesce2(EvalCoalesce):
+    """Specialization of EvalCoalesce for the common two arguments case."""
+
+    def __call__(self, context):
+        first, second = self.args
+        value = first(context)
+        if value is not None:
+            return value
+        return second(context)
+
+
 class EvalFunction(EvalNode):
     __slots__ = ('operands',)
 
     # Type constraints on the input arguments.
     __intypes__ = []
 
+    # Whether the function value depends only on its operands, thus can
+    # be computed at compile time when the operands are constants.
+    pure = False
+
     def __init__(self, context, operands, dtype):
         super().__init__(dtype)
         self.context = context
@@ -594,6 +622,26 @@ class EvalConstantSubquery1D(EvalNode):
         return self.value
 
 
+class EvalConstantFunction(EvalNode):
+    """Evaluate a function with constant arguments only once.
+
+    This is used for functions that need access to the compilation
+    context, thus cannot be evaluated at compile time, but that do not
+    depend on the row being evaluated.
+    """
+    __slots__ = ('function', 'value')
+
+    def __init__(self, function):
+        super().__init__(function.dtype)
+        self.function = function
+        self.value = MARKER
+
+    def __call__(self, context):
+        if self.value is MARKER:
+            self.value = self.function(context)
+        return self.value
+
+
 # A compiled target.
 #
 # Attributes:
@@ -1,7 +1,9 @@
 __copyright__ = "Copyright (C) 2014-2016  Martin Blais"
 __license__ = "GNU GPLv2"
 
+import copy
 import datetime
+import re
 import unittest
 
 from decimal import Decimal as D
@@ -20,6 +22,12 @@ from beanquery.parser import ast
 from beanquery.sources import test
 
 
+# Expected error messages for the FROM clause resolution tests.
+_ERR_NO_COLUMN_QUX = re.compile(r'column "qux" not found in table "postings"')
+_ERR_NO_TABLE_QUX = re.compile(r'table "qux" does not exist')
+_ERR_NO_TABLE_DATE = re.compile(r'table "date" does not exist')
+
+
 class Table:
     # mock table to be used in tests
     def __init__(self, name):
@@ -43,6 +51,15 @@ class Column(qc.EvalColumn):
         return getattr(other, 'name', type(other).__name__) == self.name
 
 
+# Mock columns shared by the expression tests.
+_COL_X = Column('x', int)
+_COL_ACCOUNT = Column('account')
+_COL_DATE = Column('date')
+_COL_DATE_TYPED = Column('date', datetime.date)
+_COL_LINENO = Column('lineno', int)
+_COL_POSITION = Column('position')
+
+
 class TestCompileExpression(unittest.TestCase):
 
     @classmethod
@@ -63,20 +80,28 @@ class TestCompileExpression(unittest.TestCase):
             self.compile('''invalid''')
 
     def test_expr_column(self):
-        self.assertEqual(self.compile('''x'''), Column('x', int))
+        self.assertEqual(self.compile('''x'''), _COL_X)
 
     def test_expr_function(self):
-        self.assertEqual(self.compile('''sum(x)'''), qe.SumInt(None, [Column('x', int)]))
+        self.assertEqual(self.compile('''sum(x)'''), qe.SumInt(None, [_COL_X]))
 
     def test_expr_unaryop(self):
-        self.assertEqual(self.compile('''not x'''), qc.Operator(ast.Not, [Column('x', int)]))
+        self.assertEqual(self.compile('''not x'''), qc.Operator(ast.Not, [_COL_X]))
 
     def test_expr_binaryop(self):
-        self.assertEqual(self.compile('''x = 1'''), qc.Operator(ast.Equal, [Column('x', int), qc.EvalConstant(1)]))
+        self.assertEqual(self.compile('''x = 1'''), qc.Operator(ast.Equal, [_COL_X, qc.EvalConstant(1)]))
 
     def test_expr_constant(self):
         self.assertEqual(self.compile('''17'''), qc.EvalConstant(D('17')))
 
+    def test_expr_function_context_constant(self):
+        # Functions accessing the context are not folded at compile time,
+        # but when their arguments are constant they are evaluated once.
+        c_expr = self.compile('''open_date('Assets:Cash')''')
+        self.assertIsInstance(c_expr, qc.EvalConstantFunction)
+        c_expr = self.compile('''open_date(str(x))''')
+        self.assertNotIsInstance(c_expr, qc.EvalConstantFunction)
+
     def test_expr_function_arity(self):
         # compile with an incorrect number of arguments.
         with self.assertRaises(CompilationError):
@@ -89,98 +114,142 @@ class TestCompileExpression(unittest.TestCase):
         self.assertEqual(self.compile('''2 + 2'''), qc.EvalConstant(D('4')))
         # funtion
         self.assertEqual(self.compile('''root('Assets:Cash', 1)'''), qc.EvalConstant('Assets'))
+        # between
+        self.assertEqual(self.compile('''2 BETWEEN 1 AND 3'''), qc.EvalConstant(True))
+        # logical operators
+        self.assertEqual(self.compile('''TRUE AND FALSE'''), qc.EvalConstant(False))
+        self.assertEqual(self.compile('''FALSE OR TRUE'''), qc.EvalConstant(True))
+        # membership
+        self.assertEqual(self.compile('''1 IN (1, 2)'''), qc.EvalConstant(True))
+        # functions without arguments
+        self.assertIsInstance(self.compile('''today()'''), qc.EvalConstant)
+        # functions with constant arguments
+        self.assertEqual(self.compile('''date(2024, 1, 1)'''), qc.EvalConstant(datetime.date(2024, 1, 1)))
+        self.assertEqual(self.compile('''upper('usd')'''), qc.EvalConstant('USD'))
+        self.assertEqual(self.compile('''date(2024, 1, 1) + interval('1 month')'''),
+                         qc.EvalConstant(datetime.date(2024, 2, 1)))
+        # coalesce
+        self.assertEqual(self.compile('''coalesce(1, 2)'''), qc.EvalConstant(1))
+        # non constant operands are not folded
+        self.assertEqual(self.compile('''TRUE AND x = 1'''), qc.EvalAnd([
+            qc.EvalConstant(True), qc.Operator(ast.Equal, [_COL_X, qc.EvalConstant(1)])]))
+
+    def test_logical_operators_short_circuit(self):
+        def fail(context):
+            raise AssertionError('operand evaluated')
+        self.assertIs(qc.EvalAnd([qc.EvalConstant(False), fail])(None), False)
+        self.assertIs(qc.EvalAnd([qc.EvalConstant(None), fail])(None), None)
+        self.assertIs(qc.EvalOr([qc.EvalConstant(True), fail])(None), True)
+
+
+# Expression trees for the aggregate checks tests. These are only inspected,
+# never evaluated, thus they can be shared between tests.
+_AGG_TREE_NO_AGG = qc.EvalAnd([
+    qc.Operator(ast.Equal, [
+        _COL_LINENO,
+        qc.EvalConstant(42),
+    ]),
+    qc.EvalOr([
+        qc.Operator(ast.Not, [
+            qc.Operator(ast.Equal, [
+                _COL_DATE_TYPED,
+                qc.EvalConstant(datetime.date(2014, 1, 1)),
+            ]),
+        ]),
+        qc.EvalConstant(False),
+    ]),
+])
+
+_AGG_TREE_WITH_AGG = qc.EvalAnd([
+    qc.Operator(ast.Equal, [
+        _COL_LINENO,
+        qc.EvalConstant(42),
+    ]),
+    qc.EvalOr([
+        qc.Operator(ast.Not, [
+            qc.Operator(ast.Not, [
+                qc.Operator(ast.Equal, [
+                    _COL_DATE_TYPED,
+                    qc.EvalConstant(datetime.date(2014, 1, 1)),
+                ]),
+            ]),
+        ]),
+        # Aggregation node deep in the tree.
+        qe.SumInt(None, [qc.EvalConstant(1)]),
+    ]),
+])
 
 
 class TestCompileAggregateChecks(unittest.TestCase):
 
     def test_is_aggregate_derived(self):
-        columns, aggregates = compiler.get_columns_and_aggregates(
-            qc.EvalAnd([
-                qc.Operator(ast.Equal, [
-                    Column('lineno', int),
-                    qc.EvalConstant(42),
-                ]),
-                qc.EvalOr([
-                    qc.Operator(ast.Not, [
-                        qc.Operator(ast.Equal, [
-                            Column('date', datetime.date),
-                            qc.EvalConstant(datetime.date(2014, 1, 1)),
-                        ]),
-                    ]),
-                    qc.EvalConstant(False),
-                ]),
-            ]))
+        columns, aggregates = compiler.get_columns_and_aggregates(_AGG_TREE_NO_AGG)
         self.assertEqual((2, 0), (len(columns), len(aggregates)))
 
-        columns, aggregates = compiler.get_columns_and_aggregates(
-            qc.EvalAnd([
-                qc.Operator(ast.Equal, [
-                    Column('lineno', int),
-                    qc.EvalConstant(42),
-                ]),
-                qc.EvalOr([
-                    qc.Operator(ast.Not, [
-                        qc.Operator(ast.Not, [
-                            qc.Operator(ast.Equal, [
-                                Column('date', datetime.date),
-                                qc.EvalConstant(datetime.date(2014, 1, 1)),
-                            ]),
-                        ]),
-                    ]),
-                    # Aggregation node deep in the tree.
-                    qe.SumInt(None, [qc.EvalConstant(1)]),
-                ]),
-            ]))
+        columns, aggregates = compiler.get_columns_and_aggregates(_AGG_TREE_WITH_AGG)
         self.assertEqual((2, 1), (len(columns), len(aggregates)))
 
     def test_get_columns_and_aggregates(self):
         # Simple column.
-        c_query = Column('position')
+        c_query = _COL_POSITION
         columns, aggregates = compiler.get_columns_and_aggregates(c_query)
         self.assertEqual((1, 0), (len(columns), len(aggregates)))
         self.assertFalse(compiler.is_aggregate(c_query))
 
         # Multiple columns.
-        c_query = qc.EvalAnd([Column('position'), Column('date')])
+        c_query = qc.EvalAnd([_COL_POSITION, _COL_DATE])
         columns, aggregates = compiler.get_columns_and_aggregates(c_query)
         self.assertEqual((2, 0), (len(columns), len(aggregates)))
         self.assertFalse(compiler.is_aggregate(c_query))
 
         # Simple aggregate.
-        c_query = qe.SumPosition(None, [Column('position')])
+        c_query = qe.SumPosition(None, [_COL_POSITION])
         columns, aggregates = compiler.get_columns_and_aggregates(c_query)
         self.assertEqual((0, 1), (len(columns), len(aggregates)))
         self.assertTrue(compiler.is_aggregate(c_query))
 
         # Multiple aggregates.
-        c_query = qc.EvalAnd([qe.First(None, [Column('date')]), qe.Last(None, [Column('flag')])])
+        c_query = qc.EvalAnd([qe.First(None, [_COL_DATE]), qe.Last(None, [Column('flag')])])
         columns, aggregates = compiler.get_columns_and_aggregates(c_query)
         self.assertEqual((0, 2), (len(columns), len(aggregates)))
         self.assertTrue(compiler.is_aggregate(c_query))
 
         # Simple non-aggregate function.
-        c_query = qe.Function('length', [Column('account')])
+        c_query = qe.Function('length', [_COL_ACCOUNT])
         columns, aggregates = compiler.get_columns_and_aggregates(c_query)
         self.assertEqual((1, 0), (len(columns), len(aggregates)))
         self.assertFalse(compiler.is_aggregate(c_query))
 
         # Mix of column and aggregates (this is used to detect this illegal case).
         c_query = qc.EvalAnd([
-            qe.Function('length', [Column('account')]),
-            qe.SumPosition(None, [Column('position')]),
+            qe.Function('length', [_COL_ACCOUNT]),
+            qe.SumPosition(None, [_COL_POSITION]),
         ])
         columns, aggregates = compiler.get_columns_and_aggregates(c_query)
         self.assertEqual((1, 1), (len(columns), len(aggregates)))
         self.assertTrue(compiler.is_aggregate(c_query))
 
+        # Shared sub-expressions are reported once.
+        c_aggregate = qe.SumPosition(None, [_COL_POSITION])
+        c_query = qc.EvalAnd([c_aggregate, qc.EvalOr([c_aggregate])])
+        columns, aggregates = compiler.get_columns_and_aggregates(c_query)
+        self.assertEqual([c_aggregate], aggregates)
+        self.assertEqual([], columns)
+
 
 class CompileSelectBase(unittest.TestCase):
 
     maxDiff = 8192
 
-    def setUp(self):
+    @classmethod
+    def setUpClass(cls):
         entries, errors, options = loader.load_string('')
-        self.ctx = Connection('beancount:', entries=entries, errors=errors, options=options)
+        cls.connection = Connection('beancount:', entries=entries, errors=errors, options=options)
+
+    def setUp(self):
+        # Share the tables but not the tables registry between tests.
+        self.ctx = copy.copy(self.connection)
+        self.ctx.tables = dict(self.connection.tables)
 
     def compile(self, query):
         """Parse one query and compile it.
@@ -212,43 +281,6 @@ class CompileSelectBase(unittest.TestCase):
             self.assertEqual(set(non_aggregate_indexes), set(query.group_indexes),
                              "Invalid indexes: {}".format(query))
 
-    def assertIndexes(self,
-                      query,
-                      expected_simple_indexes,
-                      expected_aggregate_indexes,
-                      expected_group_indexes,
-                      expected_order_spec):
-        """Check the four lists of indexes for comparison.
-
-        Args:
-          query: An instance of EvalQuery, a compiled query statement.
-          expected_simple_indexes: The expected visible non-aggregate indexes.
-          expected_aggregate_indexes: The expected visible aggregate indexes.
-          expected_group_indexes: The expected group_indexes.
-          expected_order_spec: The expected order_spec.
-        Raises:
-          AssertionError: if the check fails.
-        """
-        # Compute the list of _visible_ aggregates and non-aggregates.
-        simple_indexes = [index
-                          for index, c_target in enumerate(query.c_targets)
-                          if c_target.name and not compiler.is_aggregate(c_target.expression)]
-        aggregate_indexes = [index
-                             for index, c_target in enumerate(query.c_targets)
-                             if c_target.name and compiler.is_aggregate(c_target.expression)]
-
-        self.assertEqual(set(expected_simple_indexes), set(simple_indexes))
-
-        self.assertEqual(set(expected_aggregate_indexes), set(aggregate_indexes))
-
-        self.assertEqual(
-            set(expected_group_indexes) if expected_group_indexes is not None else None,
-            set(query.group_indexes) if query.group_indexes is not None else None)
-
-        self.assertEqual(
-            set(expected_order_spec) if expected_order_spec is not None else None,
-            set(query.order_spec) if query.order_spec is not None else None)
-
     def assertCompile(self, expected, query, debug=False):
         """Assert parsed and compiled contents from 'query' is 'expected'.
 
@@ -314,9 +346,9 @@ class TestCompileSelect(CompileSelectBase):
         # Test the wildcard expansion.
         query = self.compile("SELECT length(account), account as a, date;")
         self.assertEqual(
-            [qc.EvalTarget(qe.Function('length', [Column('account')]), 'length(account)', False),
-             qc.EvalTarget(Column('account'), 'a', False),
-             qc.EvalTarget(Column('date'), 'date', False)],
+            [qc.EvalTarget(qe.Function('length', [_COL_ACCOUNT]), 'length(account)', False),
+             qc.EvalTarget(_COL_ACCOUNT, 'a', False),
+             qc.EvalTarget(_COL_DATE, 'date', False)],
             query.c_targets)
 
     def test_compile_mixed_aggregates(self):
@@ -572,6 +604,26 @@ class TestCompileSelectOrderBy(CompileSelectBase):
         self.assertEqual([(1, False)], query.order_spec)
 
 
+# Expected targets of the SELECT statements generated from JOURNAL statements.
+_JOURNAL_TARGETS_COMMON = [
+    ast.Target(ast.Column('date'), None),
+    ast.Target(ast.Column('flag'), None),
+    ast.Target(ast.Function('maxwidth', [ast.Column('payee'), ast.Constant(48)]), None),
+    ast.Target(ast.Function('maxwidth', [ast.Column('narration'), ast.Constant(80)]), None),
+    ast.Target(ast.Column('account'), None),
+]
+_JOURNAL_TARGETS = [
+    *_JOURNAL_TARGETS_COMMON,
+    ast.Target(ast.Column('position'), None),
+    ast.Target(ast.Column('balance'), None),
+]
+_JOURNAL_TARGETS_AT_COST = [
+    *_JOURNAL_TARGETS_COMMON,
+    ast.Target(ast.Function('cost', [ast.Column('position')]), None),
+    ast.Target(ast.Function('cost', [ast.Column('balance')]), None),
+]
+
+
 class TestTranslationJournal(CompileSelectBase):
 
     maxDiff = 4096
@@ -579,79 +631,35 @@ class TestTranslationJournal(CompileSelectBase):
     def test_journal(self):
         journal = parser.parse("JOURNAL;")
         select = compiler.transform_journal(journal)
-        self.assertEqual(select,
-            ast.Select([
-                ast.Target(ast.Column('date'), None),
-                ast.Target(ast.Column('flag'), None),
-                ast.Target(ast.Function('maxwidth', [
-                    ast.Column('payee'), ast.Constant(48)]), None),
-                ast.Target(ast.Function('maxwidth', [
-                    ast.Column('narration'), ast.Constant(80)]), None),
-                ast.Target(ast.Column('account'), None),
-                ast.Target(ast.Column('position'), None),
-                ast.Target(ast.Column('balance'), None),
-            ],
-            None, None, None, None, None, None, None))
+        self.assertEqual(select, ast.Select(
+            _JOURNAL_TARGETS, None, None, None, None, None, None, None))
 
     def test_journal_with_account(self):
         journal = parser.parse("JOURNAL 'liabilities';")
         select = compiler.transform_journal(journal)
-        self.assertEqual(select, ast.Select([
-            ast.Target(ast.Column('date'), None),
-            ast.Target(ast.Column('flag'), None),
-            ast.Target(ast.Function('maxwidth', [
-                ast.Column('payee'),
-                ast.Constant(48)]), None),
-            ast.Target(ast.Function('maxwidth', [
-                ast.Column('narration'),
-                ast.Constant(80)]), None),
-            ast.Target(ast.Column('account'), None),
-            ast.Target(ast.Column('position'), None),
-            ast.Target(ast.Column('balance'), None),
-        ],
-        None,
-        ast.Match(ast.Column('account'), ast.Constant('liabilities')),
-        None, None, None, None, None))
+        self.assertEqual(select, ast.Select(
+            _JOURNAL_TARGETS,
+            None,
+            ast.Match(ast.Column('account'), ast.Constant('liabilities')),
+            None, None, None, None, None))
 
     def test_journal_with_account_and_from(self):
         journal = parser.parse("JOURNAL 'liabilities' FROM year = 2014;")
         select = compiler.transform_journal(journal)
-        self.assertEqual(select, ast.Select([
-            ast.Target(ast.Column('date'), None),
-            ast.Target(ast.Column('flag'), None),
-            ast.Target(ast.Function('maxwidth', [
-                ast.Column('payee'),
-                ast.Constant(48)]), None),
-            ast.Target(ast.Function('maxwidth', [
-                ast.Column('narration'),
-                ast.Constant(80)]), None),
-            ast.Target(ast.Column('account'), None),
-            ast.Target(ast.Column('position'), None),
-            ast.Target(ast.Column('balance'), None),
-        ],
-        ast.From(ast.Equal(ast.Column('year'), ast.Constant(2014)), None, None, None),
-        ast.Match(ast.Column('account'), ast.Constant('liabilities')),
-        None, None, None, None, None))
+        self.assertEqual(select, ast.Select(
+            _JOURNAL_TARGETS,
+            ast.From(ast.Equal(ast.Column('year'), ast.Constant(2014)), None, None, None),
+            ast.Match(ast.Column('account'), ast.Constant('liabilities')),
+            None, None, None, None, None))
 
     def test_journal_with_account_func_and_from(self):
         journal = parser.parse("JOURNAL 'liabilities' AT cost FROM year = 2014;")
         select = compiler.transform_journal(journal)
-        self.assertEqual(select, ast.Select([
-            ast.Target(ast.Column('date'), None),
-            ast.Target(ast.Column('flag'), None),
-            ast.Target(ast.Function('maxwidth', [
-                ast.Column('payee'),
-                ast.Constant(48)]), None),
-            ast.Target(ast.Function('maxwidth', [
-                ast.Column('narration'),
-                ast.Constant(80)]), None),
-            ast.Target(ast.Column('account'), None),
-            ast.Target(ast.Function('cost', [ast.Column('position')]), None),
-            ast.Target(ast.Function('cost', [ast.Column('balance')]), None),
-        ],
-        ast.From(ast.Equal(ast.Column('year'), ast.Constant(2014)), None, None, None),
-        ast.Match(ast.Column('account'), ast.Constant('liabilities')),
-        None, None, None, None, None))
+        self.assertEqual(select, ast.Select(
+            _JOURNAL_TARGETS_AT_COST,
+            ast.From(ast.Equal(ast.Column('year'), ast.Constant(2014)), None, None, None),
+            ast.Match(ast.Column('account'), ast.Constant('liabilities')),
+            None, None, None, None, None))
 
 
 class TestTranslationBalance(CompileSelectBase):
@@ -757,6 +765,15 @@ class TestCompileParameters(unittest.TestCase):
         with self.assertRaises(ProgrammingError):
             self.compile('''SELECT %s + %s''', (1, ))
 
+    def test_positional_parameters_compile_twice(self):
+        statement = parser.parse('''SELECT %s + %s''')
+        c = compiler.Compiler(self.context)
+        c.table = self.context.tables.get('')
+        query = c.compile(statement, (1, 2))
+        self.assertEqual(query.c_targets[0].c_expr, qc.EvalConstant(3))
+        query = c.compile(statement, (3, 4))
+        self.assertEqual(query.c_targets[0].c_expr, qc.EvalConstant(7))
+
     def test_missing_parameters_named(self):
         with self.assertRaises(ProgrammingError):
             self.compile('''SELECT %(x)s + %(y)s''', {'x': 1})
@@ -779,28 +796,27 @@ class TestSelectFrom(unittest.TestCase):
         return c.compile(parser.parse(query))
 
     def test_select_from(self):
-        query = self.compile('''SELECT x FROM foo''')
-        self.assertEqual(query.table, self.conn.tables['foo'])
+        # Query and name of the table the FROM clause resolves to.
+        cases = [
+            ('SELECT x FROM foo', 'foo'),
+            ('SELECT account FROM date', 'postings'),
+            ('SELECT x FROM #foo', 'foo'),
+        ]
+        for query, table in cases:
+            with self.subTest(query=query):
+                self.assertEqual(self.compile(query).table, self.conn.tables[table])
 
     def test_select_from_invalid(self):
-        with self.assertRaisesRegex(beanquery.ProgrammingError, 'column "qux" not found in table "postings"'):
-            self.compile('''SELECT x FROM qux''')
-
-    def test_select_from_column(self):
-        query = self.compile('''SELECT account FROM date''')
-        self.assertEqual(query.table, self.conn.tables['postings'])
-
-    def test_select_from_hash(self):
-        query = self.compile('''SELECT x FROM #foo''')
-        self.assertEqual(query.table, self.conn.tables['foo'])
-
-    def test_select_from_hash_invalid(self):
-        with self.assertRaisesRegex(beanquery.ProgrammingError, 'table "qux" does not exist'):
-            self.compile('''SELECT x FROM #qux''')
-
-    def test_select_from_hash_column_invalid(self):
-        with self.assertRaisesRegex(beanquery.ProgrammingError, 'table "date" does not exist'):
-            self.compile('''SELECT account FROM #date''')
+        # Query and expected error message.
+        cases = [
+            ('SELECT x FROM qux', _ERR_NO_COLUMN_QUX),
+            ('SELECT x FROM #qux', _ERR_NO_TABLE_QUX),
+            ('SELECT account FROM #date', _ERR_NO_TABLE_DATE),
+        ]
+        for query, message in cases:
+            with self.subTest(query=query):
+                with self.assertRaisesRegex(beanquery.ProgrammingError, message):
+                    self.compile(query)
 
     def test_select_from_hash_column(self):
         self.conn.execute('''CREATE table date (year int, month int, day int)''')
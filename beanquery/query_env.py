@@ -9,6 +9,8 @@ __license__ = "GNU GPLv2"
 
 import datetime
 import decimal
+import functools
+import locale
 import re
 import textwrap
 
@@ -45,24 +47,75 @@ class ColumnsRegistry(dict):
         return decorator
 
 
+class Func(query_compile.EvalFunction):
+    """Base class for the functions defined with the function() decorator.
+
+    The decorator creates a subclass for each function overload, which
+    only defines the input and output types and the implementation.
+    """
+    __outtype__ = None
+    pure = True
+
+    def __init__(self, context, operands):
+        super().__init__(context, operands, self.__outtype__)
+
+    def __call__(self, row):
+        args = []
+        for operand in self.operands:
+            arg = operand(row)
+            if arg is None:
+                return None
+            args.append(arg)
+        return self.func(*args)
+
+
+class Func1(Func):
+    """Specialization for functions with one argument."""
+
+    def __call__(self, row):
+        arg = self.operands[0](row)
+        if arg is None:
+            return None
+        return self.func(arg)
+
+
+class ContextFunc(Func):
+    """Base class for the functions that require the evaluation context."""
+    pure = False
+
+    def __call__(self, row):
+        args = []
+        for operand in self.operands:
+            arg = operand(row)
+            if arg is None:
+                return None
+            args.append(arg)
+        return self.func(self.context, *args)
+
+
+class ContextFunc1(ContextFunc):
+    """Specialization for functions with one argument that require the evaluation context."""
+
+    def __call__(self, row):
+        arg = self.operands[0](row)
+        if arg is None:
+            return None
+        return self.func(self.context, arg)
+
+
 def function(intypes, outtype, pass_context=None, name=None):
     def decorator(func):
-        class Func(query_compile.EvalFunction):
-            __intypes__ = intypes
-            pure = not pass_context
-            def __init__(self, context, operands):
-                super().__init__(context, operands, outtype)
-            def __call__(self, row):
-                args = [operand(row) for operand in self.operands]
-                for arg in args:
-                    if arg is None:
-                        return None
-                if pass_context:
-                    return func(self.context, *args)
-                return func(*args)
-        Func.__name__ = name if name is not None else func.__name__
-        Func.__doc__ = func.__doc__
-        query_compile.FUNCTIONS[Func.__name__].append(Func)
+        if pass_context:
+            base = ContextFunc1 if len(intypes) == 1 else ContextFunc
+        else:
+            base = Func1 if len(intypes) == 1 else Func
+        cls = type(name if name is not None else func.__name__, (base,), {
+            '__intypes__': intypes,
+            '__outtype__': outtype,
+            '__doc__': func.__doc__,
+            'func': staticmethod(func),
+        })
+        query_compile.FUNCTIONS[cls.__name__].append(cls)
         return func
     return decorator
 
@@ -135,6 +188,11 @@ def int_(x):
 
 
 @function([Decimal], Decimal, name='decimal')
+def decimal_decimal(x):
+    # Decimal instances are immutable, there is no need to copy them.
+    return x
+
+
 @function([int], Decimal, name='decimal')
 @function([bool], Decimal, name='decimal')
 @function([str], Decimal, name='decimal')
@@ -155,6 +213,17 @@ def str_(x):
     return str(x)
 
 
+def _strptime_date(string, frmt):
+    """Parse a date according to a format, with a fast path for ISO dates."""
+    if frmt == '%Y-%m-%d' and len(string) == 10 and string[4] == '-' and string[7] == '-':
+        try:
+            return datetime.date.fromisoformat(string)
+        except ValueError:
+            # Let strptime() handle or reject the odd cases.
+            pass
+    return datetime.datetime.strptime(string, frmt).date()
+
+
 @function([datetime.date], datetime.date, name='date')
 @function([str], datetime.date, name='date')
 @function([object], datetime.date, name='date')
@@ -163,7 +232,7 @@ def date_(x):
         return x
     if isinstance(x, str):
         try:
-            return datetime.datetime.strptime(x, '%Y-%m-%d').date()
+            return _strptime_date(x, '%Y-%m-%d')
         except ValueError:
             pass
     return None
@@ -202,7 +271,7 @@ def abs_(x):
 @function([Decimal, int], Decimal)
 def safediv(x, y):
     """A division operation that traps division by zero exceptions and outputs zero instead."""
-    if y == 0:
+    if not y:
         return ZERO
     return x / y
 
@@ -230,11 +299,23 @@ def repr_(x):
     return repr(x)
 
 
+@functools.lru_cache(maxsize=64)
+def _shortener(width):
+    # Same text wrapper textwrap.shorten() creates for every call.
+    return textwrap.TextWrapper(width=width, max_lines=1)
+
+
 @function([str, int], str)
 def maxwidth(x, n):
     """Convert the argument to a substring. This can be used to ensure
     maximum width. This will insert ellipsis ([...]) if necessary."""
-    return textwrap.shorten(x, width=n)
+    # Fast path for strings that do not need to be shortened. This
+    # collapses whitespace like textwrap.shorten() does. Widths smaller
+    # than the placeholder are left to raise ValueError as before.
+    x = ' '.join(x.split())
+    if len(x) <= n and n >= len('[...]'):
+        return x
+    return _shortener(n).fill(x)
 
 
 @function([str, int, int], str)
@@ -275,18 +356,41 @@ def yearmonth(x):
     return datetime.date(x.year, x.month, 1)
 
 
+# Quarter of the year indexed by month number.
+_QUARTERS = (None, 1, 1, 1, 2, 2, 2, 3, 3, 3, 4, 4, 4)
+
+
 @function([datetime.date], str)
 def quarter(x):
     """Extract the quarter from a date."""
-    return '{:04d}-Q{:1d}'.format(x.year, (x.month - 1) // 3 + 1)
+    return f'{x.year:04d}-Q{_QUARTERS[x.month]}'
 
 
-@function([datetime.date], str, name='weekday')
-def weekday_(x):
-    """Extract a 3-letter weekday from a date."""
+@functools.lru_cache(maxsize=4096)
+def _weekday(x, lc_time):
+    # strftime() is slow and ledgers have far fewer dates than postings.
+    # The weekday name depends on the locale, which is part of the key.
     return x.strftime('%a')
 
 
+@register('weekday')
+class Weekday(query_compile.EvalFunction):
+    """Extract a 3-letter weekday from a date."""
+    __intypes__ = [datetime.date]
+    pure = True
+
+    def __init__(self, context, operands):
+        super().__init__(context, operands, str)
+        # Read the locale once per query rather than for each row.
+        self.lc_time = locale.setlocale(locale.LC_TIME)
+
+    def __call__(self, row):
+        x = self.operands[0](row)
+        if x is None:
+            return None
+        return _weekday(x, self.lc_time)
+
+
 @function([], datetime.date)
 def today():
     """Today's date"""
@@ -317,7 +421,7 @@ def leaf(acc):
 @function([str, str], str)
 def grep(pattern, string):
     """Match a regular expression against a string and return only the matched portion."""
-    match = re.search(pattern, string)
+    match = query_compile.compile_regexp(pattern).search(string)
     if match:
         return match.group(0)
     return None
@@ -326,7 +430,7 @@ def grep(pattern, string):
 @function([str, str, int], str)
 def grepn(pattern, string, n):
     """Match a pattern with subgroups against a string and return the subgroup at the index."""
-    match = re.search(pattern, string)
+    match = query_compile.compile_regexp(pattern).search(string)
     if match:
         return match.group(n)
     return None
@@ -335,7 +439,7 @@ def grepn(pattern, string, n):
 @function([str, str, str], str)
 def subst(pattern, repl, string):
     """Substitute leftmost non-overlapping occurrences of pattern by replacement."""
-    return re.sub(pattern, repl, string)
+    return query_compile.compile_regexp(pattern).sub(repl, string)
 
 
 @function([str], str)
@@ -422,9 +526,12 @@ def currency_meta(context, commodity, key=None):
 @function([str], str, pass_context=True)
 def account_sortkey(context, acc):
     """Get a string to sort accounts in order taking into account the types."""
-    account_types = context.tables['accounts'].types
-    index, name = get_account_sort_key(account_types, acc)
-    return '{}-{}'.format(index, name)
+    table = context.tables['accounts']
+    sortkey = table.sortkeys.get(acc)
+    if sortkey is None:
+        index, name = get_account_sort_key(table.types, acc)
+        sortkey = table.sortkeys[acc] = f'{index}-{name}'
+    return sortkey
 
 
 # Stub kept only for function type checking and for generating documentation.
@@ -543,10 +650,10 @@ def findfirst(pattern, values):
     """Filter a string sequence by regular expression and return the first match."""
     if not values:
         return None
-    for value in sorted(values):
-        if re.match(pattern, value):
-            return value
-    return None
+    # The first match in sorted order is the smallest matching value:
+    # there is no need to sort all the values.
+    match = query_compile.compile_regexp(pattern).match
+    return min((value for value in values if match(value)), default=None)
 
 
 @function([set], str)
@@ -576,7 +683,14 @@ def filter_currency_position(pos, currency):
 @function([inventory.Inventory, str], inventory.Inventory, name='filter_currency')
 def filter_currency_inventory(inv, currency):
     """Filter an inventory to just the specified currency."""
-    return inventory.Inventory(pos for pos in inv if pos.units.currency == currency)
+    # Inventory positions are keyed by (currency, cost). When all the
+    # positions are in the requested currency there is nothing to filter:
+    # inventories are mutable, thus return a copy rather than the argument.
+    if all(key[0] == currency for key in inv.keys()):
+        return inventory.Inventory(inv)
+    # Building the new inventory from a dict copies it without adding the
+    # positions one by one.
+    return inventory.Inventory({key: pos for key, pos in inv.items() if key[0] == currency})
 
 
 @function([Decimal, str], Decimal, pass_context=True)
@@ -585,8 +699,10 @@ def filter_currency_inventory(inv, currency):
 @function([inventory.Inventory, str], inventory.Inventory, pass_context=True)
 def possign(context, x, account):
     """Correct sign of an Amount based on the usual balance of associated account."""
-    account_types = context.tables['accounts'].types
-    sign = get_account_sign(account, account_types)
+    table = context.tables['accounts']
+    sign = table.signs.get(account)
+    if sign is None:
+        sign = table.signs[account] = get_account_sign(account, table.types)
     return x if sign >= 0  else -x
 
 
@@ -617,7 +733,7 @@ def parse_date(string, frmt=None):
     """Parse date from string."""
     if frmt is None:
         return dateutil.parser.parse(string).date()
-    return datetime.datetime.strptime(string, frmt).date()
+    return _strptime_date(string, frmt)
 
 
 @function([datetime.date, datetime.date], int)
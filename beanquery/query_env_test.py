@@ -2,6 +2,7 @@ __copyright__ = "Copyright (C) 2014-2016  Martin Blais"
 __license__ = "GNU GPLv2"
 
 import datetime
+import textwrap
 import unittest
 from decimal import Decimal
 
@@ -145,6 +146,18 @@ class TestEnv(unittest.TestCase):
                                         'SELECT date_add(date, -1) as m')
         self.assertEqual([(datetime.date(2016, 11, 19),)], rrows)
 
+    def test_maxwidth(self):
+        for string in '', 'a', 'a  b', ' a b ', 'hello world', 'hello\tbig\nworld':
+            for width in range(1, 16):
+                with self.subTest(string=string, width=width):
+                    try:
+                        expected = textwrap.shorten(string, width=width)
+                    except ValueError:
+                        with self.assertRaises(ValueError):
+                            qe.maxwidth(string, width)
+                    else:
+                        self.assertEqual(qe.maxwidth(string, width), expected)
+
     def test_func_meta(self):
         # use the loader to have the pad transaction inserted
         entries, _, options = loader.load_string('''
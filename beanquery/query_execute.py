@@ -178,19 +178,36 @@ def execute_select(query):
         context = None
         aggregates = collections.defaultdict(create)
 
-        # Iterate over all the postings to evaluate the aggregates.
-        for context in query.table:
-            if c_where is None or c_where(context):
-
-                # Compute the non-aggregate expressions.
-                key = tuple(c_expr(context) for c_expr in c_nonaggregate_exprs)
-
-                # Get an appropriate store for the unique key of this row.
-                store = aggregates[key]
-
-                # Update the aggregate expressions.
-                for c_expr in c_aggregate_exprs:
-                    c_expr.update(store, context)
+        # Bind the aggregates update methods once, outside of the loop.
+        updates = [c_expr.update for c_expr in c_aggregate_exprs]
+
+        if not c_nonaggregate_exprs:
+            # Without non-aggregate expressions all the rows are aggregated
+            # into a single store. There is no grouping key to compute. The
+            # store is created for the first matching row, so that no row
+            # is returned when no rows match.
+            store = None
+            for context in query.table:
+                if c_where is None or c_where(context):
+                    if store is None:
+                        store = aggregates[()]
+                    for update in updates:
+                        update(store, context)
+
+        else:
+            # Iterate over all the postings to evaluate the aggregates.
+            for context in query.table:
+                if c_where is None or c_where(context):
+
+                    # Compute the non-aggregate expressions.
+                    key = tuple(c_expr(context) for c_expr in c_nonaggregate_exprs)
+
+                    # Get an appropriate store for the unique key of this row.
+                    store = aggregates[key]
+
+                    # Update the aggregate expressions.
+                    for update in updates:
+                        update(store, context)
 
         # Iterate over all the aggregations.
         for key, store in aggregates.items():
@@ -11,7 +11,10 @@ from dateutil.relativedelta import relativedelta
 from beancount.core.amount import from_string as A
 from beancount.core.number import D
 from beancount.core import inventory
+from beancount.core import position
+from beancount.core.compare import hash_entry
 from beancount.core.inventory import from_string as I
+from beancount.core.position import from_string as P
 from beancount.parser import cmptest
 from beancount.utils.test_utils import docfile
 from beancount import loader
@@ -20,6 +23,7 @@ import beanquery
 
 from beanquery import CompilationError
 from beanquery import query_compile as qc
+from beanquery import query_env as qe
 from beanquery import query_execute as qx
 from beanquery import tables
 from beanquery import compiler
@@ -182,6 +186,8 @@ class TestFundamentals(QueryBase):
         self.assertResult("SELECT date('1.2')", None, datetime.date)
         self.assertResult("SELECT date('foo')", None, datetime.date)
         self.assertResult("SELECT date('2022-04-05')", datetime.date(2022, 4, 5))
+        self.assertResult("SELECT date('2022-4-5')", datetime.date(2022, 4, 5))
+        self.assertResult("SELECT date('2022-02-30')", None, datetime.date)
         self.assertResult("SELECT date(NULL)", None, datetime.date)
         self.assertResult("SELECT date(2022-04-05)", datetime.date(2022, 4, 5))
         self.assertResult("SELECT date(2022, 4, 5)", datetime.date(2022, 4, 5))
@@ -323,6 +329,8 @@ class TestFundamentals(QueryBase):
     def test_coalesce(self):
         # coalesce
         self.assertResult("SELECT COALESCE(str(meta('missing')), '!')", "!")
+        self.assertResult("SELECT COALESCE(str(meta('lineno')), '!')", "6")
+        self.assertResult("SELECT COALESCE(str(meta('missing')), str(meta('other')), '!')", "!")
         self.assertError ("SELECT COALESCE(meta('missing'), '!')")
 
     def test_count(self):
@@ -332,6 +340,9 @@ class TestFundamentals(QueryBase):
         self.assertResult("SELECT COUNT(NULL)", 0)
         self.assertResult("SELECT COUNT(meta('missing'))", 0)
 
+    def test_location(self):
+        self.assertResult("SELECT location", '<string>:6:')
+
     def test_getitem(self):
         self.assertResult("SELECT meta['lineno']", 6, object)
         self.assertResult("SELECT 1 + meta['lineno']", Decimal('7'))
@@ -348,6 +359,17 @@ class TestFundamentals(QueryBase):
     def test_parse_date(self):
         self.assertResult('''SELECT parse_date('2016/11/1')''', datetime.date(2016, 11, 1))
         self.assertResult('''SELECT parse_date('2016/11/1', '%Y/%d/%m')''', datetime.date(2016, 1, 11))
+        self.assertResult('''SELECT parse_date('2016-11-01', '%Y-%m-%d')''', datetime.date(2016, 11, 1))
+
+    def test_quarter(self):
+        self.assertResult('''SELECT quarter(2016-01-01)''', '2016-Q1')
+        self.assertResult('''SELECT quarter(2016-06-30)''', '2016-Q2')
+        self.assertResult('''SELECT quarter(2016-07-01)''', '2016-Q3')
+        self.assertResult('''SELECT quarter(2016-12-31)''', '2016-Q4')
+
+    def test_weekday(self):
+        self.assertResult('''SELECT weekday(2024-06-09)''', 'Sun')
+        self.assertResult('''SELECT weekday(2024-06-10)''', 'Mon')
 
     def test_date_part(self):
         self.assertResult('''SELECT date_part('weekday', 2024-06-09)''', 6)
@@ -456,11 +478,33 @@ class TestBeancountFunctions(QueryBase):
 
     def test_account_sortkey(self):
         self.assertResult('''SELECT account_sortkey('Assets:Foo') LIMIT 1''', '0-Assets:Foo')
+        self.assertResult('''SELECT account_sortkey('Expenses:Foo') LIMIT 1''', '4-Expenses:Foo')
+
+    def test_possign(self):
+        self.assertResult('''SELECT possign(1.0, 'Assets:Foo') LIMIT 1''', D('1.0'))
+        self.assertResult('''SELECT possign(1.0, 'Income:Foo') LIMIT 1''', D('-1.0'))
+        self.assertResult('''SELECT possign(1.0, 'Income:Bar') LIMIT 1''', D('-1.0'))
 
     def test_has_account(self):
         self.assertResult('''SELECT has_account('Assets:Tests') LIMIT 1''', True)
         self.assertResult('''SELECT has_account('Assets:Foo') LIMIT 1''', False)
 
+    def test_findfirst(self):
+        self.assertResult('''SELECT findfirst('Expenses:', other_accounts) LIMIT 1''', 'Expenses:Tests')
+        self.assertResult('''SELECT findfirst('Income:', other_accounts) LIMIT 1''', None, str)
+
+    def test_filter_currency(self):
+        self.assertResult('''SELECT filter_currency(position, 'TEST') LIMIT 1''', P('10.000 TEST'))
+        self.assertResult('''SELECT filter_currency(position, 'USD') LIMIT 1''', None, position.Position)
+        self.assertResult('''SELECT filter_currency(balance, 'TEST') LIMIT 1''', I('10.000 TEST'))
+        self.assertResult('''SELECT filter_currency(balance, 'USD') LIMIT 1''', I(''))
+        # The result is a new inventory even when nothing is filtered out.
+        inv = I('10.000 TEST')
+        self.assertIsNot(qe.filter_currency_inventory(inv, 'TEST'), inv)
+        self.assertEqual(qe.filter_currency_inventory(inv, 'TEST'), inv)
+        inv = I('')
+        self.assertIsNot(qe.filter_currency_inventory(inv, 'TEST'), inv)
+
     def test_convert(self):
         self.assertResult('''SELECT convert(position, 'USD') LIMIT 1''', A('5.0 USD'))
         self.assertResult('''SELECT convert(sum(position), 'USD')''', I('0.0 USD'))
@@ -730,6 +774,64 @@ class TestExecuteNonAggregatedQuery(QueryBase):
                 (datetime.date(2010, 2, 23), '*', None, 'Bla'),
                 ])
 
+    def test_non_aggregated_balance(self):
+        # The running balance is updated once per row even when the
+        # column is evaluated more than once.
+        self.check_query(
+            self.INPUT,
+            """
+            SELECT balance, units(balance);
+            """,
+            [
+                ('balance', inventory.Inventory),
+                ('units(balance)', inventory.Inventory),
+                ],
+            [
+                (I('100.00 USD'), I('100.00 USD')),
+                (I(''), I('')),
+                ])
+
+    def test_non_aggregated_accounts(self):
+        entries, errors, options = loader.load_string(textwrap.dedent(self.INPUT))
+        ctx = beanquery.connect('beancount:', entries=entries, errors=errors, options=options)
+        rows = ctx.execute('''SELECT accounts, 'Expenses:.*' ?~ ANY(accounts)''').fetchall()
+        accounts = {'Assets:Bank:Checking', 'Expenses:Restaurant'}
+        self.assertEqual(rows, [(accounts, True), (accounts, True)])
+        # The two postings of the transaction share the same value, which
+        # thus must not be modifiable.
+        for value, _ in rows:
+            self.assertIsInstance(value, frozenset)
+
+    def test_non_aggregated_description(self):
+        self.check_query(
+            """
+            2010-01-01 open Assets:Bank:Checking
+
+            2010-02-23 * "Payee" "Narration"
+              Assets:Bank:Checking       100.00 USD
+
+            2010-02-24 * "Narration"
+              Assets:Bank:Checking       100.00 USD
+
+            2010-02-25 * "Payee" ""
+              Assets:Bank:Checking       100.00 USD
+
+            2010-02-26 * ""
+              Assets:Bank:Checking       100.00 USD
+            """,
+            """
+            SELECT description;
+            """,
+            [
+                ('description', str),
+                ],
+            [
+                ('Payee | Narration',),
+                ('Narration',),
+                ('Payee',),
+                ('',),
+                ])
+
     def test_non_aggregated_order_by_visible(self):
         self.check_query(
             self.INPUT,
@@ -787,6 +889,19 @@ class TestExecuteNonAggregatedQuery(QueryBase):
                 ('Expenses:Restaurant',),
                 ])
 
+    def test_non_aggregated_id(self):
+        entries, errors, options = loader.load_string(textwrap.dedent(self.INPUT + """
+          2010-02-24 * "Baz"
+            Assets:Bank:Checking       -10.00 USD
+            Expenses:Restaurant         10.00 USD
+        """))
+        ctx = beanquery.connect('beancount:', entries=entries, errors=errors, options=options)
+        rows = ctx.execute('SELECT id, entry').fetchall()
+        self.assertEqual(len(rows), 4)
+        for entry_id, entry in rows:
+            self.assertEqual(entry_id, hash_entry(entry))
+        self.assertEqual(len({entry_id for entry_id, entry in rows}), 2)
+
 
 class TestExecuteAggregatedQuery(QueryBase):
 
@@ -816,6 +931,31 @@ class TestExecuteAggregatedQuery(QueryBase):
                 ('Assets:Bank:Checking', 'Expenses:Restaurant'),
                 ])
 
+    def test_aggregated_without_group_by_where(self):
+        # All rows matching the WHERE clause are aggregated into one.
+        self.check_query(
+            self.INPUT,
+            """
+            SELECT count(*), sum(number) WHERE number > 0;
+            """,
+            [
+                ('count(*)', int),
+                ('sum(number)', Decimal),
+                ],
+            [
+                (1, Decimal('100.00')),
+                ])
+        # No row is returned when no row matches.
+        self.check_query(
+            self.INPUT,
+            """
+            SELECT count(*) WHERE account = 'Assets:Other';
+            """,
+            [
+                ('count(*)', int),
+                ],
+            [])
+
     def test_aggregated_group_by_all_explicit(self):
         # All columns ('account', 'len') are subject of a group-by.
         self.check_query(
@@ -16,7 +16,7 @@ import traceback
 import warnings
 
 from contextlib import nullcontext, suppress
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, replace
 from os import path
 
 import click
@@ -388,7 +388,9 @@ class BQLShell(DispatchingShell):
         if (isinstance(statement, parser.ast.Select) and
             isinstance(statement.from_clause, parser.ast.From) and
             not statement.from_clause.close):
-            statement.from_clause.close = default_close_date
+            # Build a new statement rather than modifying the parsed one.
+            from_clause = replace(statement.from_clause, close=default_close_date)
+            statement = replace(statement, from_clause=from_clause)
         return statement
 
     def execute(self, query, **kwargs):
@@ -2,6 +2,7 @@ __copyright__ = "Copyright (C) 2014-2016  Martin Blais"
 __license__ = "GNU GPLv2"
 
 import functools
+import io
 import re
 import sys
 import textwrap
@@ -292,6 +293,37 @@ class TestRun(unittest.TestCase):
         self.assertRegex(out, 'account +total')
         self.assertRegex(out, 'Expenses:Home:Rent')
 
+    def test_run_custom__close_date(self):
+        # The close date of a stored query must not apply to the same
+        # query text run later on.
+        entries, errors, options = loader.load_string(textwrap.dedent("""
+          2022-01-01 open Assets:Checking
+          2022-01-01 open Income:ACME
+
+          2022-01-01 * "January"
+            Assets:Checking           10.00 USD
+            Income:ACME
+
+          2022-02-01 * "February"
+            Assets:Checking           10.00 USD
+            Income:ACME
+
+          2022-01-15 query "checking" "
+            SELECT narration FROM year = 2022 WHERE account = 'Assets:Checking'"
+        """))
+        outfile = io.StringIO()
+        shell_obj = shell.BQLShell('', outfile)
+        shell_obj.context.attach('beancount:', entries=entries, errors=errors, options=options)
+        shell_obj._extract_queries(entries)  # pylint: disable=protected-access
+        shell_obj.onecmd('.run checking')
+        self.assertIn('January', outfile.getvalue())
+        self.assertNotIn('February', outfile.getvalue())
+        outfile.seek(0)
+        outfile.truncate()
+        shell_obj.execute(shell_obj.queries['checking'].query_string)
+        self.assertIn('January', outfile.getvalue())
+        self.assertIn('February', outfile.getvalue())
+
 
 class TestCommands(unittest.TestCase):
 
@@ -1,11 +1,11 @@
 import copy
 import datetime
+import operator
 import sys
 import types as _types
 import typing
 
 from decimal import Decimal
-from functools import lru_cache as cache
 from urllib.parse import urlparse
 
 from beancount import loader
@@ -40,6 +40,9 @@ hashable.register(data.Transaction, lambda t: (t.date, t.flag, t.narration))
 
 _TABLES = []
 
+# Lowercase name of the directive types, reported by the type column.
+_TYPE_NAMES = {datatype: datatype.__name__.lower() for datatype in data.ALL_DIRECTIVES}
+
 
 def attach(context, dsn, *, entries=None, errors=None, options=None):
     filename = urlparse(dsn).path
@@ -68,9 +71,10 @@ class GetAttrColumn(query_compile.EvalColumn):
     def __init__(self, name, dtype):
         super().__init__(dtype)
         self.name = name
+        self.getter = operator.attrgetter(name)
 
     def __call__(self, context):
-        return getattr(context, self.name)
+        return self.getter(context)
 
 
 def _simplify_typing_annotation(dtype):
@@ -207,9 +211,10 @@ class GetItemColumn(query_compile.EvalColumn):
     def __init__(self, key, dtype):
         super().__init__(dtype)
         self.key = key
+        self.getter = operator.itemgetter(key)
 
     def __call__(self, row):
-        return row[self.key]
+        return self.getter(row)
 
 
 class AccountsTable(tables.Table):
@@ -223,6 +228,10 @@ class AccountsTable(tables.Table):
     def __init__(self, entries, options):
         self.accounts = get_account_open_close(entries)
         self.types = parser.options.get_account_types(options)
+        # Per-account memoized sign and sort key, computed on demand
+        # by the possign() and account_sortkey() query functions.
+        self.signs = {}
+        self.sortkeys = {}
 
     def __iter__(self):
         return ((name, value[0], value[1]) for name, value in self.accounts.items())
@@ -297,7 +306,10 @@ class EntriesTable(_BeancountTable):
     @columns.register(str)
     def type(entry):
         """The data type of the directive."""
-        return type(entry).__name__.lower()
+        name = _TYPE_NAMES.get(type(entry))
+        if name is None:
+            name = type(entry).__name__.lower()
+        return name
 
     @columns.register(str)
     def filename(entry):
@@ -355,7 +367,11 @@ class EntriesTable(_BeancountTable):
         """A combination of the payee + narration of the transaction, if present."""
         if not isinstance(entry, data.Transaction):
             return None
-        return ' | '.join(filter(None, [entry.payee, entry.narration]))
+        payee = entry.payee
+        narration = entry.narration
+        if payee:
+            return f'{payee} | {narration}' if narration else payee
+        return narration or ''
 
     @columns.register(set)
     def tags(entry):
@@ -381,22 +397,29 @@ _TABLES.append(EntriesTable)
 class _PostingsTableRow:
     """A dumb container for information used by a row expression."""
 
+    __slots__ = ('rowid', 'balance', 'balance_rowid', 'balance_snapshot',
+                 'entry', 'entry_id', 'entry_accounts', 'posting')
+
     def __init__(self):
         self.rowid = 0
         self.balance = inventory.Inventory()
 
+        # The row id and the value of the last computed balance snapshot.
+        self.balance_rowid = None
+        self.balance_snapshot = None
+
         # The current transaction of the posting being evaluated.
         self.entry = None
 
+        # The unique id of the current transaction, computed on demand.
+        self.entry_id = None
+
+        # The accounts referenced by the current transaction, computed on demand.
+        self.entry_accounts = None
+
         # The current posting being evaluated.
         self.posting = None
 
-    def __hash__(self):
-        # The context hash is used in caching column accessor functions.
-        # Instead than hashing the row context content, use the rowid as
-        # hash.
-        return self.rowid
-
 
 class PostingsTable(_BeancountTable):
     name = 'postings'
@@ -409,6 +432,8 @@ class PostingsTable(_BeancountTable):
         for entry in entries:
             if isinstance(entry, data.Transaction):
                 context.entry = entry
+                context.entry_id = None
+                context.entry_accounts = None
                 for posting in entry.postings:
                     context.rowid += 1
                     context.posting = posting
@@ -421,7 +446,12 @@ class PostingsTable(_BeancountTable):
     @columns.register(str)
     def id(context):
         """Unique id of a directive."""
-        return hash_entry(context.entry)
+        # Hashing the transaction is expensive, compute it only once for
+        # all its postings.
+        entry_id = context.entry_id
+        if entry_id is None:
+            entry_id = context.entry_id = hash_entry(context.entry)
+        return entry_id
 
     @columns.register(datetime.date)
     def date(context):
@@ -471,7 +501,7 @@ class PostingsTable(_BeancountTable):
         # None. See https://github.com/beancount/beancount/issues/767
         if meta is None:
             return None
-        return '{:s}:{:d}:'.format(meta['filename'], meta['lineno'])
+        return f"{meta['filename']:s}:{meta['lineno']:d}:"
 
     @columns.register(str)
     def flag(context):
@@ -491,7 +521,12 @@ class PostingsTable(_BeancountTable):
     @columns.register(str)
     def description(context):
         """A combination of the payee + narration for the transaction of this posting."""
-        return ' | '.join(filter(None, [context.entry.payee, context.entry.narration]))
+        entry = context.entry
+        payee = entry.payee
+        narration = entry.narration
+        if payee:
+            return f'{payee} | {narration}' if narration else payee
+        return narration or ''
 
     @columns.register(set)
     def tags(context):
@@ -532,25 +567,25 @@ class PostingsTable(_BeancountTable):
     def cost_number(context):
         """The number of cost units of the posting."""
         cost = context.posting.cost
-        return cost.number if cost else None
+        return cost.number if cost is not None else None
 
     @columns.register(str)
     def cost_currency(context):
         """The cost currency of the posting."""
         cost = context.posting.cost
-        return cost.currency if cost else None
+        return cost.currency if cost is not None else None
 
     @columns.register(datetime.date)
     def cost_date(context):
         """The cost currency of the posting."""
         cost = context.posting.cost
-        return cost.date if cost else None
+        return cost.date if cost is not None else None
 
     @columns.register(str)
     def cost_label(context):
         """The cost currency of the posting."""
         cost = context.posting.cost
-        return cost.label if cost else ''
+        return cost.label if cost is not None else ''
 
     @columns.register(position.Position)
     def position(context):
@@ -569,16 +604,20 @@ class PostingsTable(_BeancountTable):
         return convert.get_weight(context.posting)
 
     @columns.register(inventory.Inventory)
-    @cache(maxsize=1)  # noqa: B019
     def balance(context):
         """The balance for the posting. These can be summed into inventories."""
         # Caching protects against multiple balance updates per row when
         # the columns appears more than once in the execurted query. The
-        # rowid in the row context guarantees that otherwise identical
-        # rows do not hit the cache and thus that the balance is correctly
-        # updated.
-        context.balance.add_position(context.posting)
-        return copy.copy(context.balance)
+        # rowid in the row context guarantees that the balance is updated
+        # exactly once per row.
+        if context.balance_rowid == context.rowid:
+            return context.balance_snapshot
+        balance = context.balance
+        balance.add_position(context.posting)
+        # Inventory.__copy__() does the same, without the copy module dispatch.
+        snapshot = context.balance_snapshot = inventory.Inventory(balance)
+        context.balance_rowid = context.rowid
+        return snapshot
 
     @columns.register(dict)
     def meta(context):
@@ -590,6 +629,11 @@ class PostingsTable(_BeancountTable):
 
     @columns.register(typing.Set[str])
     def accounts(context):
-        return {p.account for p in context.entry.postings}
+        # Compute the set only once for all the postings of a transaction.
+        # The set is shared by the rows of these postings: make it immutable.
+        accounts = context.entry_accounts
+        if accounts is None:
+            accounts = context.entry_accounts = frozenset(p.account for p in context.entry.postings)
+        return accounts
 
 _TABLES.append(PostingsTable)
@@ -0,0 +1,27 @@
+import copy
+import unittest
+
+from beanquery.sources import beancount
+
+
+class TestGetterColumns(unittest.TestCase):
+    def test_getattr(self):
+        column = beancount.GetAttrColumn('date', int)
+        self.assertEqual(column.name, 'date')
+        self.assertEqual(column(beancount.data.Price({}, 1, 'USD', None)), 1)
+
+    def test_getitem(self):
+        column = beancount.AccountsTable.columns['account']
+        self.assertEqual(column.key, 0)
+        self.assertEqual(column(('Assets:Cash', None, None)), 'Assets:Cash')
+
+    def test_copy(self):
+        for column in beancount.GetAttrColumn('date', int), beancount.Position.columns['units']:
+            self.assertEqual(copy.copy(column), column)
+            self.assertEqual(copy.deepcopy(column), column)
+        column = beancount.AccountsTable.columns['account']
+        self.assertEqual(copy.deepcopy(column)(('Assets:Cash', None, None)), 'Assets:Cash')
+
+    def test_equal(self):
+        self.assertEqual(beancount.GetAttrColumn('date', int), beancount.GetAttrColumn('date', int))
+        self.assertEqual(beancount.GetItemColumn(0, str), beancount.GetItemColumn(0, str))
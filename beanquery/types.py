@@ -66,9 +66,13 @@ def function_lookup(functions, name, operands):
     Returns:
       A EvalNode (or subclass) instance or None if the function was not found.
     """
+    candidates = functions.get(name)
+    if not candidates:
+        return None
     for signature in itertools.product(*(_bases(operand.dtype) for operand in operands)):
-        for func in functions[name]:
-            if func.__intypes__ == list(signature):
+        signature = list(signature)
+        for func in candidates:
+            if func.__intypes__ == signature:
                 return func
     return None
 